@@ -1,14 +1,57 @@
+import base64
+import csv
+import hashlib
+import io
 import os
 import math
+import sys
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from decimal import Decimal
+import orjson
+from cachetools import TTLCache, cached
+from flask import Flask, request, send_from_directory
+from flask_compress import Compress
+from flask.json.provider import JSONProvider
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Float, DateTime, func
+    create_engine, Column, Integer, String, Float, DateTime, Computed, Index,
+    func, or_, select, text, tuple_
 )
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, scoped_session, sessionmaker
 
 app = Flask(__name__)
 
+# Compress JSON bodies per Accept-Encoding (brotli first, gzip fallback);
+# book pages repeat field names and image URLs, so they shrink a lot.
+app.config["COMPRESS_MIMETYPES"] = ["application/json"]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+Compress(app)
+
+# ---------- JSON ----------
+def _default(obj):
+    # orjson already handles datetime/date natively; cover the rest here
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
+def json_response(payload, status=200):
+    # Skip jsonify: orjson gives us bytes directly, no str round-trip
+    return app.response_class(
+        orjson.dumps(payload, default=_default, option=orjson.OPT_NAIVE_UTC),
+        status=status,
+        mimetype="application/json",
+    )
+
 # ---------- DB ----------
 def _get_database_url() -> str:
     url = os.getenv("DATABASE_URL", "").strip()
@@ -22,18 +65,43 @@ def _get_database_url() -> str:
     return url
 
 DATABASE_URL = _get_database_url()
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=10,
+    pool_recycle=1800,
+)
+# One session per thread, reused for the whole request and removed on teardown
+SessionLocal = scoped_session(
+    sessionmaker(bind=engine, autoflush=False, autocommit=False)
+)
+
+@app.teardown_appcontext
+def remove_session(exc=None):
+    SessionLocal.remove()
+
 Base = declarative_base()
 
 PLACEHOLDER_IMG = "https://placehold.co/160x220?text=Book"
 
-ALLOWED_PAGE_SIZES = {5, 10, 20, 50}
-ALLOWED_SORT_FIELDS = {"title", "author", "year", "rating", "price", "created_at"}
+ALLOWED_PAGE_SIZES = frozenset({5, 10, 20, 50})
+ALLOWED_SORT_FIELDS = frozenset({"title", "author", "year", "rating", "price", "created_at"})
+
+# Text the full-text search runs against (kept in sync with the tsv column)
+FTS_DOCUMENT = "to_tsvector('english', title || ' ' || author)"
+FTS_MIN_QUERY_LEN = 3
 
 CATEGORY_OPTIONS = [
     "Fantasy", "Sci-Fi", "Classic", "Horror", "Mystery", "Non-Fiction", "Other"
 ]
+# O(1) membership for validation; interned so accepted categories share one
+# string object per value
+CATEGORY_SET = frozenset(sys.intern(c) for c in CATEGORY_OPTIONS)
+
+def utc_now():
+    # Naive UTC timestamp computed by Postgres (the old datetime.utcnow)
+    return func.timezone("utc", func.now())
 
 class Book(Base):
     __tablename__ = "books"
@@ -42,25 +110,92 @@ class Book(Base):
     title = Column(String(255), nullable=False)
     author = Column(String(255), nullable=False)
     year = Column(Integer, nullable=False)
-    category = Column(String(80), nullable=False, default="Other")
-    rating = Column(Float, nullable=False, default=0.0)  # 0–5
-    price = Column(Float, nullable=False, default=0.0)   # >= 0
-    image_url = Column(String(1000), nullable=False, default=PLACEHOLDER_IMG)
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
-
-def book_to_dict(b: Book):
+    # Defaults live in Postgres, so inserts that omit a field (bulk seeds,
+    # COPY) get them in-row and every app instance shares one clock
+    category = Column(String(80), nullable=False, server_default="Other")
+    rating = Column(Float, nullable=False, server_default=text("0.0"))  # 0–5
+    price = Column(Float, nullable=False, server_default=text("0.0"))   # >= 0
+    image_url = Column(String(1000), nullable=False, server_default=PLACEHOLDER_IMG)
+    created_at = Column(DateTime, nullable=False, server_default=utc_now())
+    updated_at = Column(
+        DateTime, nullable=False, server_default=utc_now(), onupdate=utc_now()
+    )
+    # Stored generated column, so Postgres computes the vector once per write
+    tsv = deferred(Column(TSVECTOR, Computed(FTS_DOCUMENT, persisted=True)))
+
+    # B-tree per sortable field (id as tie-breaker) so get_books' ORDER BY
+    # can walk an index in order instead of sorting the filtered rows.
+    __table_args__ = (
+        Index("ix_books_cat_created", "category", created_at.desc(), id.desc()),
+        Index("ix_books_created_at", "created_at", "id"),
+        Index("ix_books_title", "title", "id"),
+        Index("ix_books_author", "author", "id"),
+        Index("ix_books_year", "year", "id"),
+        Index("ix_books_rating", "rating", "id"),
+        Index("ix_books_price", "price", "id"),
+    )
+
+# get_books reads through the plain Table (Core only, no ORM layer)
+books_table = Book.__table__
+
+# sortBy value -> column, resolved once instead of per request
+SORT_COLUMNS = {name: books_table.c[name] for name in ALLOWED_SORT_FIELDS}
+
+# Column order row_to_dict() unpacks
+BOOK_COLUMNS = tuple(books_table.c[name] for name in (
+    "id", "title", "author", "year", "category",
+    "rating", "price", "image_url", "created_at",
+))
+
+def row_to_dict(row):
+    # Columns are NOT NULL and rating/price are rounded on write, so values
+    # pass straight through; created_at stays a datetime and orjson encodes
+    # it (as UTC ISO 8601) in the same pass as the rest.
+    id_, title, author, year, category, rating, price, image_url, created_at = row
     return {
-        "id": b.id,
-        "title": b.title,
-        "author": b.author,
-        "year": b.year,
-        "category": b.category,
-        "rating": round(float(b.rating or 0.0), 2),
-        "price": round(float(b.price or 0.0), 2),
-        "imageUrl": b.image_url,
-        "createdAt": b.created_at.isoformat() if b.created_at else None,
+        "id": id_,
+        "title": title,
+        "author": author,
+        "year": year,
+        "category": category,
+        "rating": rating,
+        "price": price,
+        "imageUrl": image_url,
+        "createdAt": created_at,
     }
 
+def book_to_dict(b: Book):
+    return row_to_dict((
+        b.id, b.title, b.author, b.year, b.category,
+        b.rating, b.price, b.image_url, b.created_at,
+    ))
+
+# How a cursor's sort value is parsed back, per sort field
+CURSOR_PARSERS = {
+    "title": str,
+    "author": str,
+    "year": int,
+    "rating": float,
+    "price": float,
+    "created_at": datetime.fromisoformat,
+}
+
+def encode_cursor(sort_by, sort_dir, sort_value, book_id):
+    # Opaque token for the last row of a page; bound to the sort it came from
+    raw = orjson.dumps([sort_by, sort_dir, sort_value, book_id])
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor, sort_by, sort_dir):
+    try:
+        c_sort_by, c_sort_dir, sort_value, book_id = orjson.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        if (c_sort_by, c_sort_dir) != (sort_by, sort_dir):
+            return None
+        return CURSOR_PARSERS[sort_by](sort_value), int(book_id)
+    except Exception:
+        return None
+
 def _safe_int(val, default=None):
     try:
         return int(val)
@@ -73,16 +208,22 @@ def _safe_float(val, default=None):
     except Exception:
         return default
 
+def _clean_str(val):
+    # JSON payload fields are almost always str already; skip the str() copy
+    if isinstance(val, str):
+        return val.strip()
+    return str(val).strip()
+
 def validate_book_payload(data: dict):
-    title = str(data.get("title", "")).strip()
-    author = str(data.get("author", "")).strip()
+    title = _clean_str(data.get("title", ""))
+    author = _clean_str(data.get("author", ""))
     year = _safe_int(data.get("year", None), default=None)
 
-    category = str(data.get("category", "Other")).strip() or "Other"
+    category = _clean_str(data.get("category", "Other")) or "Other"
     rating = _safe_float(data.get("rating", 0), default=None)
     price = _safe_float(data.get("price", 0), default=None)
 
-    image_url = str(data.get("imageUrl", "")).strip()
+    image_url = _clean_str(data.get("imageUrl", ""))
 
     if not title:
         return "Title is required.", None
@@ -93,7 +234,9 @@ def validate_book_payload(data: dict):
     if year < 0 or year > 2100:
         return "Year must be between 0 and 2100.", None
 
-    if category not in CATEGORY_OPTIONS:
+    if category in CATEGORY_SET:
+        category = sys.intern(category)
+    else:
         # Keep it permissive but consistent
         category = "Other"
 
@@ -115,14 +258,103 @@ def validate_book_payload(data: dict):
         "author": author,
         "year": year,
         "category": category,
-        "rating": float(rating),
-        "price": float(price),
+        # Rounded once here (the write path) so reads can pass them through
+        "rating": round(rating, 2),
+        "price": round(price, 2),
         "image_url": image_url,
     }
     return None, cleaned
 
+def ensure_schema():
+    # Columns/indexes added after the table first shipped, which create_all()
+    # won't add to an existing table. GIN indexes back get_books search: the
+    # stored tsvector for full-text matches, and trigrams so the %q% ILIKE
+    # filter can use an index scan instead of reading every row.
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "ALTER TABLE books ADD COLUMN IF NOT EXISTS tsv tsvector "
+            f"GENERATED ALWAYS AS ({FTS_DOCUMENT}) STORED"
+        ))
+        conn.execute(text(
+            "ALTER TABLE books ADD COLUMN IF NOT EXISTS updated_at timestamp "
+            "NOT NULL DEFAULT timezone('utc', now())"
+        ))
+        # Defaults used to be Python-side only
+        conn.execute(text(
+            "ALTER TABLE books "
+            "ALTER COLUMN category SET DEFAULT 'Other', "
+            "ALTER COLUMN rating SET DEFAULT 0.0, "
+            "ALTER COLUMN price SET DEFAULT 0.0, "
+            f"ALTER COLUMN image_url SET DEFAULT '{PLACEHOLDER_IMG}', "
+            "ALTER COLUMN created_at SET DEFAULT timezone('utc', now())"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_books_fts ON books USING gin (tsv)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_books_title_trgm "
+            "ON books USING gin (title gin_trgm_ops)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_books_author_trgm "
+            "ON books USING gin (author gin_trgm_ops)"
+        ))
+        # create_all() only builds model indexes together with a new table
+        for index in Book.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+# Batches at least this large are loaded with COPY instead of INSERT
+COPY_THRESHOLD = 1000
+SEED_COLUMNS = ("title", "author", "year", "category", "rating", "price", "image_url")
+
+def _insert_books(db, rows):
+    # One statement for the whole batch (no per-row ORM flush); caller commits
+    if not rows:
+        return
+    if len(rows) < COPY_THRESHOLD:
+        db.bulk_insert_mappings(Book, rows)
+        return
+
+    # created_at/updated_at come from the column defaults
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[c] for c in SEED_COLUMNS])
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY books ({', '.join(SEED_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+    finally:
+        cursor.close()
+
+def seed_fields(n):
+    # Deterministic “domain” fields for seed rows 1..n, as parallel lists.
+    # Integer math with one final division already yields the exact
+    # 1-decimal values, so no round() per field is needed.
+    idx = range(1, n + 1)
+    categories = [CATEGORY_OPTIONS[i % len(CATEGORY_OPTIONS)] for i in idx]
+    ratings = [((i * 37) % 50) / 10 for i in idx]  # 0.0–4.9
+    prices = [(50 + (i * 19) % 300) / 10 for i in idx]  # 5.00–34.90
+    return categories, ratings, prices
+
+def round_stored_amounts():
+    # Rows written before validation rounded rating/price; no-op afterwards
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE books SET rating = round(rating::numeric, 2), "
+            "price = round(price::numeric, 2) "
+            "WHERE rating <> round(rating::numeric, 2)::float8 "
+            "OR price <> round(price::numeric, 2)::float8"
+        ))
+
 def seed_if_needed():
     Base.metadata.create_all(engine)
+    ensure_schema()
+    round_stored_amounts()
     db = SessionLocal()
     try:
         count = db.query(func.count(Book.id)).scalar() or 0
@@ -145,48 +377,101 @@ def seed_if_needed():
             ]
 
         # Insert until we reach 30
-        inserted = 0
+        categories, ratings, prices = seed_fields(len(seed_rows))
+        books = []
         for i, row in enumerate(seed_rows, start=1):
-            # Make deterministic “domain” fields
-            category = CATEGORY_OPTIONS[i % len(CATEGORY_OPTIONS)]
-            rating = round(((i * 37) % 50) / 10, 1)  # 0.0–4.9
-            price = round(5 + ((i * 19) % 300) / 10, 2)  # 5.00–34.90
-            img = f"https://placehold.co/160x220?text=Book+{i}"
-
-            b = Book(
-                title=row.get("title", f"Book {i}"),
-                author=row.get("author", "Unknown"),
-                year=int(row.get("year", 2000)),
-                category=category,
-                rating=rating,
-                price=price,
-                image_url=img,
-            )
-            db.add(b)
-            inserted += 1
+            books.append({
+                "title": row.get("title", f"Book {i}"),
+                "author": row.get("author", "Unknown"),
+                "year": int(row.get("year", 2000)),
+                "category": categories[i - 1],
+                "rating": ratings[i - 1],
+                "price": prices[i - 1],
+                "image_url": f"https://placehold.co/160x220?text=Book+{i}",
+            })
+        _insert_books(db, books)
 
-        db.commit()
         # If still < 30, top up
         count2 = db.query(func.count(Book.id)).scalar() or 0
-        while count2 < 30:
-            i = count2 + 1
-            b = Book(
-                title=f"Seed Book {i}",
-                author="Seed Author",
-                year=2000 + (i % 20),
-                category="Other",
-                rating=3.5,
-                price=9.99,
-                image_url=f"https://placehold.co/160x220?text=Seed+{i}",
-            )
-            db.add(b)
-            db.commit()
-            count2 += 1
+        _insert_books(db, [
+            {
+                "title": f"Seed Book {i}",
+                "author": "Seed Author",
+                "year": 2000 + (i % 20),
+                "category": "Other",
+                "rating": 3.5,
+                "price": 9.99,
+                "image_url": f"https://placehold.co/160x220?text=Seed+{i}",
+            }
+            for i in range(count2 + 1, 31)
+        ])
+        db.commit()
     finally:
-        db.close()
+        SessionLocal.remove()
 
 seed_if_needed()
 
+# ---------- Response caches ----------
+# Constant for the life of the process, so serialize it (and its whole
+# response) once; the ETag lets browsers revalidate with a bodiless 304.
+_META_BYTES = orjson.dumps({
+    "pageSizes": sorted(list(ALLOWED_PAGE_SIZES)),
+    "categories": CATEGORY_OPTIONS,
+    "sortFields": sorted(list(ALLOWED_SORT_FIELDS)),
+    "placeholderImage": PLACEHOLDER_IMG
+})
+_META_ETAG = hashlib.sha1(_META_BYTES).hexdigest()
+_META_CACHE_HEADERS = {
+    "Cache-Control": "public, max-age=3600",
+    "ETag": f'"{_META_ETAG}"',
+}
+_META_RESP = (_META_BYTES, 200, {"Content-Type": "application/json", **_META_CACHE_HEADERS})
+_META_NOT_MODIFIED = (b"", 304, _META_CACHE_HEADERS)
+
+# Bumped by every write so cached stats never outlive a change made through
+# this process; the TTL bounds staleness from writes in other workers.
+_data_generation = 0
+
+def _bump_generation():
+    global _data_generation
+    _data_generation += 1
+
+@cached(TTLCache(maxsize=len(ALLOWED_PAGE_SIZES), ttl=30), lock=threading.Lock())
+def _stats_body(page_size, generation):
+    db = SessionLocal()
+    # one scan / round-trip for all scalar aggregates
+    total, avg_year, avg_rating, total_value = db.query(
+        func.count(Book.id),
+        func.avg(Book.year),
+        func.avg(Book.rating),
+        func.sum(Book.price),
+    ).one()
+    total = total or 0
+    avg_year = avg_year or 0
+
+    # count by category
+    rows = db.query(Book.category, func.count(Book.id)).group_by(Book.category).all()
+    count_by_category = {cat: int(cnt) for (cat, cnt) in rows}
+
+    return orjson.dumps({
+        "total": int(total),
+        "pageSize": int(page_size),
+        "averagePublicationYear": int(round(avg_year)) if total else 0,
+        "averageRating": round(float(avg_rating or 0), 2),
+        "totalValue": round(float(total_value or 0), 2),
+        "countByCategory": count_by_category
+    })
+
+def etag_matches(etag):
+    # flask-compress rewrites the ETag of compressed bodies to "<etag>:<algo>"
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return True
+    return any(
+        tag.split(":", 1)[0] == etag
+        for tag in if_none_match.as_set(include_weak=True)
+    )
+
 # ---------- Static frontend (no Netlify) ----------
 @app.route("/")
 def root():
@@ -200,143 +485,186 @@ def static_files(path):
 # ---------- API ----------
 @app.route("/api/meta", methods=["GET"])
 def meta():
-    return jsonify({
-        "pageSizes": sorted(list(ALLOWED_PAGE_SIZES)),
-        "categories": CATEGORY_OPTIONS,
-        "sortFields": sorted(list(ALLOWED_SORT_FIELDS)),
-        "placeholderImage": PLACEHOLDER_IMG
-    })
+    if etag_matches(_META_ETAG):
+        return _META_NOT_MODIFIED
+    return _META_RESP
 
 @app.route("/api/books", methods=["GET"])
 def get_books():
-    page = _safe_int(request.args.get("page", 1), default=1)
-    page_size = _safe_int(request.args.get("pageSize", 10), default=10)
-    q = str(request.args.get("q", "")).strip()
-    category = str(request.args.get("category", "")).strip()
-    sort_by = str(request.args.get("sortBy", "created_at")).strip()
-    sort_dir = str(request.args.get("sortDir", "desc")).strip().lower()
+    # request.args values are already str; type=int falls back on bad input
+    args = request.args
+    page = args.get("page", 1, type=int)
+    page_size = args.get("pageSize", 10, type=int)
+    q = args.get("q", "").strip()
+    category = args.get("category", "").strip()
+    sort_by = args.get("sortBy", "created_at").strip()
+    sort_dir = args.get("sortDir", "desc").strip().lower()
+    cursor = args.get("cursor", "").strip()
+    exact_total = args.get("exactTotal", "true").strip().lower() != "false"
 
     if page < 1:
         page = 1
     if page_size not in ALLOWED_PAGE_SIZES:
         page_size = 10
-    if sort_by not in ALLOWED_SORT_FIELDS:
+    sort_col = SORT_COLUMNS.get(sort_by)
+    if sort_col is None:
         sort_by = "created_at"
+        sort_col = SORT_COLUMNS[sort_by]
     if sort_dir not in {"asc", "desc"}:
         sort_dir = "desc"
 
-    db = SessionLocal()
-    try:
-        query = db.query(Book)
-
-        if q:
-            like = f"%{q}%"
-            query = query.filter(
-                (Book.title.ilike(like)) | (Book.author.ilike(like))
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, sort_by, sort_dir)
+        if after is None:
+            return json_response({"error": "Invalid cursor."}, 400)
+
+    c = books_table.c
+    filters = []
+
+    if q:
+        # Plain ILIKE (not lower(...) LIKE) so the trigram indexes apply
+        like = f"%{q}%"
+        if len(q) >= FTS_MIN_QUERY_LEN:
+            # Full-text match adds stemming/multi-word search; ILIKE keeps
+            # partial-word matches. Postgres ORs the two GIN index scans.
+            filters.append(or_(
+                c.tsv.op("@@")(func.plainto_tsquery("english", q)),
+                c.title.ilike(like),
+                c.author.ilike(like),
+            ))
+        else:
+            filters.append(
+                (c.title.ilike(like)) | (c.author.ilike(like))
             )
 
-        if category:
-            query = query.filter(Book.category == category)
-
-        total = query.with_entities(func.count(Book.id)).scalar() or 0
-
-        sort_col = getattr(Book, sort_by)
-        query = query.order_by(sort_col.asc() if sort_dir == "asc" else sort_col.desc())
-
-        offset = (page - 1) * page_size
-        items = query.offset(offset).limit(page_size).all()
-
-        # clamp page if out of range after deletes
-        total_pages = max(1, math.ceil(total / page_size)) if total else 1
-        if page > total_pages and total > 0:
-            page = total_pages
-
-        return jsonify({
-            "items": [book_to_dict(b) for b in items],
-            "total": total,
+    if category:
+        filters.append(c.category == category)
+
+    offset = (page - 1) * page_size
+    page_filters = list(filters)
+    if after is not None:
+        # Keyset: seek past the previous page's last (sort value, id)
+        # through the (sort_col, id) index instead of skipping rows
+        key = tuple_(sort_col, c.id)
+        page_filters.append(key > tuple_(*after) if sort_dir == "asc" else key < tuple_(*after))
+        offset = 0
+
+    # Core select on a pooled connection: rows come back as plain tuples with
+    # no Session, ORM compile step or identity map.
+    with engine.connect() as conn:
+        etag = None
+        if exact_total:
+            # Fingerprint of the filtered set (any insert, update or delete
+            # moves one of these); a client already holding it gets a 304
+            # before the page itself is ever read.
+            total, max_id, max_updated = conn.execute(
+                select(func.count(), func.max(c.id), func.max(c.updated_at)).where(*filters)
+            ).one()
+            etag = hashlib.sha1(f"{total}:{max_id}:{max_updated}".encode()).hexdigest()
+            if etag_matches(etag):
+                return b"", 304, {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+
+        # One extra row tells us whether there is a next page
+        rows = conn.execute(
+            select(*BOOK_COLUMNS)
+            .where(*page_filters)
+            .order_by(*(
+                (sort_col.asc(), c.id.asc()) if sort_dir == "asc"
+                else (sort_col.desc(), c.id.desc())
+            ))
+            .offset(offset)
+            .limit(page_size + 1)
+        ).all()
+
+    has_more = len(rows) > page_size
+    next_cursor = None
+    if has_more:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, sort_dir, getattr(last, sort_by), last.id)
+    items = [row_to_dict(r) for r in rows]
+
+    if not exact_total:
+        # exactTotal=false: no count at all, just whether another page exists
+        return json_response({
+            "items": items,
             "page": page,
             "pageSize": page_size,
-            "totalPages": total_pages
+            "hasMore": has_more,
+            "nextCursor": next_cursor
         })
-    finally:
-        db.close()
+
+    # clamp page if out of range after deletes
+    total_pages = max(1, math.ceil(total / page_size)) if total else 1
+    if page > total_pages and total > 0:
+        page = total_pages
+
+    resp = json_response({
+        "items": items,
+        "total": total,
+        "page": page,
+        "pageSize": page_size,
+        "totalPages": total_pages,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    })
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True
+    return resp
 
 @app.route("/api/books", methods=["POST"])
 def create_book():
     data = request.get_json(silent=True) or {}
     err, cleaned = validate_book_payload(data)
     if err:
-        return jsonify({"error": err}), 400
+        return json_response({"error": err}, 400)
 
     db = SessionLocal()
-    try:
-        b = Book(**cleaned)
-        db.add(b)
-        db.commit()
-        db.refresh(b)
-        return jsonify(book_to_dict(b)), 201
-    finally:
-        db.close()
+    b = Book(**cleaned)
+    db.add(b)
+    db.commit()
+    db.refresh(b)
+    _bump_generation()
+    return json_response(book_to_dict(b), 201)
 
 @app.route("/api/books/<int:book_id>", methods=["PUT"])
 def update_book(book_id):
     data = request.get_json(silent=True) or {}
     err, cleaned = validate_book_payload(data)
     if err:
-        return jsonify({"error": err}), 400
+        return json_response({"error": err}, 400)
 
     db = SessionLocal()
-    try:
-        b = db.query(Book).filter(Book.id == book_id).first()
-        if not b:
-            return jsonify({"error": "Book not found."}), 404
+    b = db.query(Book).filter(Book.id == book_id).first()
+    if not b:
+        return json_response({"error": "Book not found."}, 404)
 
-        for k, v in cleaned.items():
-            setattr(b, k, v)
+    for k, v in cleaned.items():
+        setattr(b, k, v)
 
-        db.commit()
-        db.refresh(b)
-        return jsonify(book_to_dict(b))
-    finally:
-        db.close()
+    db.commit()
+    db.refresh(b)
+    _bump_generation()
+    return json_response(book_to_dict(b))
 
 @app.route("/api/books/<int:book_id>", methods=["DELETE"])
 def delete_book(book_id):
     db = SessionLocal()
-    try:
-        b = db.query(Book).filter(Book.id == book_id).first()
-        if not b:
-            return jsonify({"error": "Book not found."}), 404
-        db.delete(b)
-        db.commit()
-        return jsonify({"ok": True})
-    finally:
-        db.close()
+    b = db.query(Book).filter(Book.id == book_id).first()
+    if not b:
+        return json_response({"error": "Book not found."}, 404)
+    db.delete(b)
+    db.commit()
+    _bump_generation()
+    return json_response({"ok": True})
 
 @app.route("/api/stats", methods=["GET"])
 def stats():
-    page_size = _safe_int(request.args.get("pageSize", 10), default=10)
+    page_size = request.args.get("pageSize", 10, type=int)
     if page_size not in ALLOWED_PAGE_SIZES:
         page_size = 10
 
-    db = SessionLocal()
-    try:
-        total = db.query(func.count(Book.id)).scalar() or 0
-        avg_year = db.query(func.avg(Book.year)).scalar() or 0
-        avg_rating = db.query(func.avg(Book.rating)).scalar() or 0
-        total_value = db.query(func.sum(Book.price)).scalar() or 0
-
-        # count by category
-        rows = db.query(Book.category, func.count(Book.id)).group_by(Book.category).all()
-        count_by_category = {cat: int(cnt) for (cat, cnt) in rows}
-
-        return jsonify({
-            "total": int(total),
-            "pageSize": int(page_size),
-            "averagePublicationYear": int(round(avg_year)) if total else 0,
-            "averageRating": round(float(avg_rating or 0), 2),
-            "totalValue": round(float(total_value or 0), 2),
-            "countByCategory": count_by_category
-        })
-    finally:
-        db.close()
+    return app.response_class(
+        _stats_body(page_size, _data_generation), mimetype="application/json"
+    )